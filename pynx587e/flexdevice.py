@@ -1,21 +1,19 @@
-# Standard library imports
-from datetime import datetime
-
-
 class FlexDevice:
+    # One instance per zone/partition; _update reads and writes mask
+    # and times directly on every status change
+    __slots__ = ('_fd_elements', 'mask', 'times')
+
     def __init__(self, fd_elements):
-        self._flexDeviceState = {}
-        # Construct all the key/value elements for a device
-        # For element, also create a element_time key/value
-        for item in fd_elements:
-            item_time = item+'_time'
-            self._flexDeviceState[item] = -1
-            self._flexDeviceState[item_time] = -1
+        self._fd_elements = fd_elements
+        # Element values are packed into mask (bit i is the value of
+        # fd_elements[i]) and mask is None until the first update.
+        # times[i] is the time element i was last updated.
+        self.mask = None
+        self.times = [None] * len(fd_elements)
 
     def get(self, item):
-        return self._flexDeviceState[item]
-
-    def set(self,  item, value):
-        item_time = item+'_time'
-        self._flexDeviceState[item] = value
-        self._flexDeviceState[item_time] = datetime.now()
+        if item.endswith('_time'):
+            return self.times[self._fd_elements.index(item[:-5])]
+        if self.mask is None:
+            return None
+        return bool(self.mask >> self._fd_elements.index(item) & 1)
@@ -1,7 +1,10 @@
 # Standard library imports
 import random
+import re
 import queue
+import string
 import time
+from datetime import datetime
 from threading import Thread
 
 # Related third party imports.
@@ -12,6 +15,43 @@ import model
 import serialreader
 import flexdevice
 
+# Matches a status message such as ZN002FttBaillb, capturing the event
+# type (ZN), the node-id (002) and the status characters (FttBaillb).
+# Node-ids are at most 3 digits (Q001 to Q200 in the NX-587E
+# Specification). Messages are matched as bytes, as read from the
+# serial port.
+_EVENT_RE = re.compile(
+    rb'^(' + b'|'.join(event_type.encode()
+                       for event_type in model._NX_EVENT_TYPES)
+    + rb')(\d{1,3})([A-Za-z]+)$')
+
+# Maps the event type captured by _EVENT_RE to its _NX_EVENT_TYPES key
+_EVENT_TYPE_KEYS = {
+    event_type.encode(): event_type for event_type in model._NX_EVENT_TYPES
+}
+
+# Prefixes of the status messages handled by _decode
+_EVENT_PREFIXES = tuple(_EVENT_TYPE_KEYS)
+
+# Function commands accepted by NXController.send() for each keymap,
+# including the nx587_setup command, encoded ready to be written to the
+# serial port
+_COMMANDS = {
+    keymap: {name: command.encode()
+             for name, command in dict(
+                 commands, nx587_setup=model._setup_options).items()}
+    for keymap, commands in model._supported_keymaps.items()
+}
+
+# A 4 or 6 digit user code accepted by NXController.send()
+_USER_CODE_RE = re.compile(r'[0-9]{4}([0-9]{2})?')
+
+# Translates status characters to binary digits (upper case '1', lower
+# case '0') so a status can be packed into an int with int(..., 2)
+_STATE_BITS = bytes.maketrans(
+    (string.ascii_uppercase + string.ascii_lowercase).encode(),
+    b'1' * 26 + b'0' * 26)
+
 
 class NXSystemError(Exception):
     '''Basic Exception for errors raised with NXSystem'''
@@ -54,6 +94,9 @@ class NXController:
         else:
             raise KeyMapError("Unsupported keymap")
 
+        # Function commands accepted by send() for this keymap
+        self._commands = _COMMANDS[keymap]
+
         # client ID
         self.c_id = c_id
 
@@ -62,7 +105,8 @@ class NXController:
         self._connection_requested = False
         self._first_time = True
 
-        # Callback functions
+        # Callback functions (on_event is called from the serial reader
+        # thread)
         self.on_event = None
         self.on_connect = None
         self.on_disconnect = None
@@ -78,7 +122,7 @@ class NXController:
         '''
         if self._run_threads is False:
             # Start the Serial Connection Manager thread to manage
-            # reader/writer/processor threads and re-connection
+            # reader/writer threads and re-connection
             # logic.
             self._connection_requested = True
             connection_mgr_thread = Thread(target=self._connection_manager,
@@ -106,44 +150,45 @@ class NXController:
 
     def _decode(self, raw_event):
         '''
-        Return a dictionary representation of raw_event
+        Return a tuple representation of raw_event, or None if
+        raw_event is not a complete status message for a device within
+        NX_MAX_NODES
 
         :param raw_event: A transition status message from the NX-587E
-        :type raw_event: string
+        :type raw_event: bytes
         '''
         multi_state_event = None
 
-        event_type = raw_event[0:2]
-        # Valid 'event_type's' are defined in model._NX.MESSAGE_TYPES
-        if event_type in model._NX_EVENT_TYPES:
-            # Extract node-id (e.g partition # or zone #)
-            # (1..n digits after character 2 in raw_event)
-            id_start_char = 2
-            status_position = id_start_char
-            num_char = id_start_char + 1
-            while raw_event[2:num_char].isnumeric():
-                node_id = int(raw_event[2:num_char])
-                num_char += 1
-                # id can be 1..n digits so
-                # advance status_position indicator
-                status_position += 1
-
-            # topic_list is a position dependent list of characters
-            # representing topics in raw_event (starting after the id)
-            #
-            # The topic payload is is represented as as:
-            #  UPPER CASE character: 'TRUE'
-            #  lower case character: 'False'
-            topic_list = {}
-            for i, v in enumerate(
-                    raw_event[status_position:len(raw_event)]
-                    ):
-                topic_list[
-                    model._NX_EVENT_TYPES[
-                        event_type][i]] = v.isupper()
-
-            multi_state_event = {'type': event_type,
-                                 'node_id': node_id, "topics": topic_list}
+        # Split raw_event into event type, node-id (e.g partition # or
+        # zone #) and the status characters in a single match
+        match = _EVENT_RE.match(raw_event)
+        if match is not None:
+            event_type, node_id, status = match.groups()
+            event_type = _EVENT_TYPE_KEYS[event_type]
+            node_id = int(node_id)
+            # Check if partition/zone ID is within _NX_MAX_DEVICES limits
+            # before decoding the status, ID > MAX devices is ignored
+            if 0 < node_id <= self.NX_MAX_NODES[event_type]:
+                # status is a position dependent string of characters
+                # representing topics in raw_event (starting after the
+                # id) and is packed into 'state' with bit i representing
+                # topic i.
+                #
+                # The topic payload is is represented as as:
+                #  UPPER CASE character: 'TRUE'
+                #  lower case character: 'False'
+                # A status shorter than the defined topics (e.g. a
+                # truncated or corrupted line) is ignored, otherwise the
+                # missing topics would be packed as False. Characters
+                # beyond the defined topics are ignored and the status
+                # is reversed so the first character becomes the least
+                # significant bit
+                topic_count = len(model._NX_EVENT_TYPES[event_type])
+                if len(status) >= topic_count:
+                    bits = status[topic_count-1::-1].translate(_STATE_BITS)
+                    state = int(bits, 2)
+
+                    multi_state_event = (event_type, node_id, state)
 
         return multi_state_event
 
@@ -151,69 +196,64 @@ class NXController:
         ''' Update the individual topic state with those contained in
         'event' and trigger the callback self.on_event
 
-        .. note: If the existing topic value is -1 then this
+        .. note: If no state has been stored for the device then this
         is the first update to the element and the callback function
         is skipped.
 
         -- note:
-        multi_state_event = {'type': event_type,
-                             'node_id': node_id, "topics": topic_list
-                             }
+        multi_state_event = (event_type, node_id, state)
 
-        :param event: An multi_state_event List
-        :type List
+        :param event: An multi_state_event tuple
+        :type tuple
         '''
-        event_type = event.get('type')
-        node_id = event.get('node_id')
-        # topic_list is a List representing states in the multi-state
-        # event
-        topic_list = event.get('topics')
-
-        # Check if partition/zone ID is within _NX_MAX_DEVICES limits
-        if node_id <= self.NX_MAX_NODES[event_type]:
-            # for each event in the multi-state event...
-            for topic, payload in topic_list.items():
-                # Get the previously stored topic...
-                previous_topic_value = self.deviceBank[
-                    event_type][node_id-1].get(topic)
-                # Compare previously stored event with current event
-                skip_callback = False
-                if previous_topic_value != payload:
-                    # -1 indicates an update has yet to occur.
-                    # This is the first update, to be trigged by this
-                    # class to establish state.
-                    if previous_topic_value == -1:
-                        # skip the callback function to whilst the state is
-                        # being established.
-                        skip_callback = True
-                    else:
-                        pass
-
-                    # Update topic status
-                    self.deviceBank[
-                        event_type][node_id-1].set(topic, payload)
+        # state is an int representing states in the multi-state
+        # event, one bit per topic
+        event_type, node_id, state = event
+
+        device = self.deviceBank[event_type][node_id-1]
+        previous_state = device.mask
+        # The NX-587E often repeats an unchanged status so only
+        # process states that differ from the stored state
+        if state != previous_state:
+            device.mask = state
+            event_time = datetime.now()
+            if previous_state is None:
+                # No previous state indicates an update has yet to
+                # occur. This is the first update, to be trigged by
+                # this class to establish state, so skip the callback
+                # function whilst the state is being established.
+                device.times[:] = [event_time] * len(device.times)
+            else:
+                # Bind names used for every changed topic as locals
+                topics = model._NX_EVENT_TYPES[event_type]
+                times = device.times
+                on_event = self.on_event
+                c_id = self.c_id
+                # Each set bit in 'changed' is a topic whose value
+                # differs from the stored value
+                changed = state ^ previous_state
+                while changed:
+                    bit = changed & -changed
+                    changed ^= bit
+                    i = bit.bit_length() - 1
+                    # Update topic time
+                    times[i] = event_time
 
                     # Construct an event dictionary to
                     # represent the latest event state
-                    individual_event = {"client_id": self.c_id,
+                    individual_event = {"client_id": c_id,
                                         "type": event_type,
                                         "node_id": node_id,
-                                        "topic": topic,
-                                        "payload": payload,
-                                        "time": self.deviceBank[
-                                         event_type][
-                                         node_id-1].get(str(topic+'_time')),
+                                        "topic": topics[i],
+                                        "payload": bool(state & bit),
+                                        "time": event_time,
                                         }
                     # Execute the callback function with the
                     # latest event state that changed.
-                    if skip_callback is False:
-                        if self.on_event is not None:
-                            self.on_event(individual_event)
-                else:
-                    # Update not required
-                    pass
+                    if on_event is not None:
+                        on_event(individual_event)
         else:
-            # ID > MAX devices, ignore message
+            # State unchanged, update not required
             pass
 
     def get_status(self, event_type, node_id, topic):
@@ -233,23 +273,32 @@ class NXController:
            [true,2021-01-05 16:00:29.689725] which means:
             - status of Zone 1's fault (tripped) is TRUE;
             - and the associated event time.
+           [None, None] is returned until the first status message for
+           the node has been received.
 
         :return: List [topic, topic_time] for invalid requests
         :rtype: List
+
+        :raises pynx587e.nx587e.GetStatusError: event_type, node_id or
+           topic is invalid
         '''
         if self._run_threads:
             # Check if the query_type is valid as defined in
             # _NX_EVENT_TYPES
             if event_type in model._NX_EVENT_TYPES:
                 # Check if node_id is valid as defined in _NX_MAX_DEVICES
-                if node_id <= self.NX_MAX_NODES[event_type]:
+                if node_id > self.NX_MAX_NODES[event_type]:
+                    raise GetStatusError("node_id out of range")
+                # Check if the topic is valid as defined in
+                # _NX_EVENT_TYPES
+                elif topic not in model._NX_EVENT_TYPES[event_type]:
+                    raise GetStatusError("Invalid topic")
+                else:
                     cached_attribute = self.deviceBank[
                         event_type][node_id-1].get(topic)
                     cached_attribute_time = self.deviceBank[
                         event_type][node_id-1].get(topic+'_time')
                     status = [cached_attribute, cached_attribute_time]
-                else:
-                    raise GetStatusError("node_id out of range")
 
             else:
                 raise GetStatusError("Invalid event type")
@@ -258,37 +307,18 @@ class NXController:
 
         return status
 
-    def _direct_query(self, event_type, node_id):
-        '''Directly query the Zone or Partition status from the
-        NX-587E. Results are processed by _event_process.
-
-        :param event_type: Query type as defined in _MX_MESSAGE_TYPES
-        :type event_type: string
-
-        :raises queue.Full: If command queue is full
+    def _direct_query_all(self):
+        '''Directly query the status of every Zone and Partition within
+        NX_MAX_NODES from the NX-587E.
 
-        .. note:: _direct_query is for internal use module use. Users of
-        pyNX587E should use getStatus rather than _direct_query.
+        .. note:: The queries are queued as one command so the serial
+        writer sends them with a single write. Queries are fixed length
+        so the NX-587E reads them back to back. Replies are processed by
+        _serial_reader like any other status message.
         '''
-        # Check if the query_type is valid as defined in
-        # _NX_EVENT_TYPES
-        if event_type in model._NX_EVENT_TYPES:
-            # Check if the node_id is valid as defined in _NX_MAX_DEVICES
-            if node_id <= self.NX_MAX_NODES[event_type]:
-                # Construct a query based on the NX-587E Specification
-                # Q001 to Q192 is for Zone Queries (Zone 1-192)
-                # Q193 to Q200 is for Partition  Queries (1-9)
-                if event_type == "PA":
-                    query = "Q"+str(192+node_id)
-                elif event_type == "ZN":
-                    query = "Q"+str(node_id).zfill(3)
-                # Put the query into the _command_q
-                # which will be processed by the serial writer thread
-                try:
-                    self._command_q.put_nowait(query)
-                except queue.Full as e:
-                    print(e)
-                    self._stop_threads()
+        query = b"".join(b"".join(queries)
+                         for queries in self._queries.values())
+        self._command_q.put_nowait(query)
 
     def send(self, in_command):
         ''''Sends an alarm panel command or user code via the NX-587E
@@ -297,8 +327,6 @@ class NXController:
         :param in_command: An NX-148E function command or user code
         :type in_command: string
 
-        :raises queue.Full: If command queue is full
-
         .. note::
            AU/NZ installations support the following commands
            partial, chime, exit, bypass, on, fire, medical, hold_up,
@@ -310,27 +338,16 @@ class NXController:
            or a 4 or 6 digit user code.
         '''
 
-        # Set supported_commands
-        if self._keymap in model._supported_keymaps:
-            supported_commands = model._supported_keymaps[self._keymap]
+        # Check if it is a function command in the keymap or the
+        # nx587_setup command
+        command = self._commands.get(in_command)
         # A 4 or 6 digit code is also a valid input
         # This typically arms/disarms the panel
-        if in_command.isnumeric() and (
-                len(in_command) == 4 or len(in_command == 6)):
-            command = in_command
-        # or check if it is a function command in the keymap
-        elif in_command in supported_commands:
-            command = supported_commands[in_command]
-        # or check if it is the nd587_setup command
-        elif in_command == "nx587_setup":
-            command = model._setup_options
+        if command is None and _USER_CODE_RE.fullmatch(in_command):
+            command = in_command.encode()
         # Send the command to the _command_q Queue
-        if command != "":
-            try:
-                self._command_q.put_nowait(command)
-            except queue.Full as e:
-                print(e)
-                self._stop_threads()
+        if command is not None:
+            self._command_q.put_nowait(command)
 
     def _serial_writer(self, serial_conn, command_q):
         ''' Reads command from queue and writes to the serial port.
@@ -339,84 +356,98 @@ class NXController:
         pySerial.
         :type serial_conn: serial.Serial
 
-        :param command_q: Queue to read commands from
-        :type command_q: Queue
+        :param command_q: Queue to read encoded commands from
+        :type command_q: queue.SimpleQueue
 
         .. note:: Designed to run as a daemonic thread
+
+        .. note:: A None command is the shutdown sentinel queued by
+        _stop_threads
         '''
-        while self._run_threads:
+        # Bind names used for every command as locals
+        get = command_q.get
+        get_nowait = command_q.get_nowait
+        write = serial_conn.write
+        running = True
+        while running:
+            # ensure a blocking mechanism is used to reduce CPU
+            # usage i.e do not use get_no_wait() until a command
+            # has arrived
+            command = get()
+            if command is None:
+                break
+            # Commands are often queued in bursts, so collect everything
+            # already queued and send it with one write. The NX-587E
+            # reads its input as a stream so the result is the same.
+            commands = [command]
             try:
-                # ensure a blocking mechanism is used to reduce CPU
-                # usage i.e do not use get_no_wait()
-                command = command_q.get(block=True, timeout=2)
+                while True:
+                    command = get_nowait()
+                    if command is None:
+                        running = False
+                        break
+                    commands.append(command)
             except queue.Empty:
                 pass
-            else:
-                b = bytearray()
-                b.extend(command.encode())
-                try:
-                    serial_conn.write(b)
-                except serial.serialutil.PortNotOpenError:
-                    self._stop_threads()
+            try:
+                write(b"".join(commands))
+            except serial.serialutil.PortNotOpenError:
+                self._stop_threads()
+                break
 
-    def _serial_reader(self, serial_conn, raw_event_q):
-        ''' Reads message from serial port and writes it to a Queue
-        for further processing.
+    def _serial_reader(self, serial_conn):
+        ''' Reads message from serial port and sends message for decoding.
 
         :param serial_conn: An instance of serial.Serial from
         pySerial.
         :type serial_conn: serial.Serial
 
-        :param raw_event_q: Queue to write serial message to
-        :type command_q: Queue
+        .. note:: Designed to run as a daemonic thread. Exits when the
+        serial port is closed.
 
-        .. note:: Designed to run as a daemonic thread
+        .. note:: on_event callbacks run on this thread, so a slow
+        callback delays reading further messages.
         '''
         # seralreader is wrapper for pyserial that provides a
-        # higher-performance readline function
+        # higher-performance readlines function
         # DO NOT use read_until or readline from the pyserial
         serial_reader = serialreader.Serialreader(serial_conn)
+        # Bind names used for every message as locals
+        readlines = serial_reader.readlines
+        decode = self._decode
+        update = self._update
 
-        while self._run_threads:
+        while True:
             # NX-587E outputs an event starting with a line feed and
             # terminating with a charater break
             try:
-                raw_line = serial_reader.readline().decode().strip()
+                raw_lines = readlines()
             except Exception:
                 # manage a hot-unplug of serial port
-                # e.g. USB converter removed
-                self._stop_threads()
-            else:
-                if (raw_line):
-                    raw_event_q.put(raw_line)
-
-    def _event_producer(self, serial_conn, raw_event_q):
-        ''' Reads message from raw_event_q and sends message for decoding.
-
-        :param serial_conn: An instance of serial.Serial from
-         pySerial.
-        :type serial_conn: serial.Serial
-
-        :param raw_event_q: Queue to read messages from.
-        :type command_q: Queue
-
-        '''
-        while self._run_threads:
-            try:
-                # block to prevent busy-waiting
-                raw_event = raw_event_q.get(block=True, timeout=2)
-            except queue.Empty:
-                pass
+                # e.g. USB converter removed.
+                # The read also fails once _stop_threads has closed the
+                # port, in which case the threads are already stopping.
+                if self._run_threads:
+                    self._stop_threads()
+                break
             else:
-                # convert the raw event to multi_state_event List
-                event = self._decode(raw_event)
-                # update event state, event == None means unknown msg
-                if(event is not None):
-                    self._update(event)
+                for raw_line in raw_lines:
+                    # Messages are kept as bytes, only the parts needed
+                    # are converted by _decode
+                    raw_line = raw_line.strip()
+                    # Ignore anything that is not a status message
+                    # (e.g. blank lines and other NX-587E output)
+                    if raw_line.startswith(_EVENT_PREFIXES):
+                        # convert the raw event to a multi_state_event tuple
+                        event = decode(raw_line)
+                        # update event state, event == None means unknown
+                        # msg
+                        if(event is not None):
+                            update(event)
 
     def _connect_and_process(self):
         ''' Establish a connection to the NX-587E, create
-        consumer and producer threads to handle messages and commands
+        serial reader and writer threads to handle messages and commands
         '''
         try:
             self.serial_conn = serial.Serial(baudrate=9600,
@@ -426,24 +457,50 @@ class NXController:
             self._stop_threads()
         else:
             self._first_time = False
-            # Queues for outbound commands and inbound events
-            self._command_q = queue.Queue(maxsize=0)
-            self._raw_event_q = queue.Queue(maxsize=0)
+            # Ask the serial driver to pass received bytes on immediately
+            # rather than batching them (e.g. the 16ms latency timer of
+            # FTDI USB adaptors). Only supported by pySerial on Linux and
+            # by drivers that implement ASYNC_LOW_LATENCY. Other POSIX
+            # platforms raise NotImplementedError, Windows has no such
+            # method (AttributeError) and drivers that reject the ioctl
+            # raise ValueError or OSError; all leave the port usable.
+            try:
+                self.serial_conn.set_low_latency_mode(True)
+            except (AttributeError, NotImplementedError, ValueError,
+                    OSError):
+                pass
+
+            # Queue for outbound commands
+            # SimpleQueue is unbounded and lighter than Queue, the
+            # task_done/join tracking of Queue is not needed
+            self._command_q = queue.SimpleQueue()
 
             # Queue up command to set NX-587 reporting options
             self.send("nx587_setup")
 
             # Create deviceBank from NX_MAX_DEVICES definition to represent
-            # the defined number of devices (e.g. Zones and Partitions)
+            # the defined number of devices (e.g. Zones and Partitions).
+            # The number of devices is fixed so each bank is a tuple.
             self.deviceBank = {}
             for device, max_item in self.NX_MAX_NODES.items():
-                self.deviceBank[device] = []
-                i = 0
-                while i < max_item:
-                    self.deviceBank[device].append(
-                        flexdevice.FlexDevice(model._NX_EVENT_TYPES[device]))
-                    self._direct_query(device, i+1)
-                    i = i+1
+                self.deviceBank[device] = tuple(
+                    flexdevice.FlexDevice(model._NX_EVENT_TYPES[device])
+                    for i in range(max_item))
+
+            # Status query for each node, based on the NX-587E
+            # Specification, built from NX_MAX_NODES like deviceBank.
+            # Q001 to Q192 is for Zone Queries (Zone 1-192)
+            # Q193 to Q200 is for Partition  Queries (1-9)
+            # Queries are stored encoded, ready to be written to the port
+            self._queries = {
+                "ZN": tuple("Q{:03d}".format(i+1).encode()
+                            for i in range(self.NX_MAX_NODES["ZN"])),
+                "PA": tuple("Q{}".format(192+i+1).encode()
+                            for i in range(self.NX_MAX_NODES["PA"])),
+            }
+
+            # Establish the state of every device
+            self._direct_query_all()
 
             # Define threads
             serial_writer_thread = Thread(
@@ -457,15 +514,6 @@ class NXController:
             serial_reader_thread = Thread(
                 target=self._serial_reader,
                 args=(self.serial_conn,
-                      self._raw_event_q,
-                      ),
-                daemon=True
-                )
-
-            event_producer_thread = Thread(
-                target=self._event_producer,
-                args=(self.serial_conn,
-                      self._raw_event_q,
                       ),
                 daemon=True
                 )
@@ -476,7 +524,6 @@ class NXController:
             # Start communications threads
             serial_writer_thread.start()
             serial_reader_thread.start()
-            event_producer_thread.start()
 
             # Trigger on_connect back function
             if self.on_connect is not None:
@@ -509,9 +556,11 @@ class NXController:
 
     def _stop_threads(self):
         '''
-        Stop instance by setting _run_flag to False
+        Stop instance by setting _run_flag to False and waking the
+        serial writer with a shutdown sentinel
         '''
         self._run_threads = False
+        self._command_q.put(None)
         self.serial_conn.close()
 
     def _serial_is_available(self):
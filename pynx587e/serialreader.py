@@ -19,3 +19,15 @@ class Serialreader:
                 return r
             else:
                 self.buf.extend(data)
+
+    def readlines(self):
+        # Block for at least one byte, then read everything waiting in
+        # one call and return all complete lines (without the "\r").
+        # A trailing partial line is kept in buf for the next call.
+        while True:
+            self.buf.extend(self.s.read(max(1, self.s.in_waiting)))
+            i = self.buf.rfind(b"\r")
+            if i >= 0:
+                r = self.buf[:i].split(b"\r")
+                del self.buf[:i+1]
+                return r